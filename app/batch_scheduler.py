@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Callable, List
+
+from app import delayed_queue
+from app.tasks import PROCESSING_DELAY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def _publish_batch(transaction_ids: List[str]) -> None:
+    """Park a batch in the delayed set with one ZADD."""
+    delayed_queue.push(transaction_ids, time.time() + PROCESSING_DELAY_SECONDS)
+
+
+def _connect_redis() -> None:
+    """Open a connection in the Redis pool that _publish_batch draws from."""
+    delayed_queue.redis_client.ping()
+
+
+class BatchScheduler:
+    """
+    Buffers transaction ids and schedules them in the Redis delayed set in batches.
+
+    It never publishes Celery tasks itself: app.delayer hands the ids to the
+    worker once they are due. enqueue() never touches Redis, so the webhook
+    response does not wait on it. A background flusher drains up to batch_size
+    ids every flush_interval seconds and schedules them with one ZADD. Batches
+    that cannot be scheduled within publish_timeout are handed to fallback one
+    id at a time.
+    """
+
+    def __init__(
+        self,
+        fallback: Callable[[str], None],
+        batch_size: int = 100,
+        flush_interval: float = 0.005,
+        publish_timeout: float = 2.0
+    ):
+        self._fallback = fallback
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._publish_timeout = publish_timeout
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._flusher_task = None
+
+    async def enqueue(self, transaction_id: str) -> None:
+        """Queue a transaction for background processing."""
+        await self._queue.put(transaction_id)
+
+    async def warm_up(self, timeout: float = 5.0) -> None:
+        """
+        Connect to Redis ahead of the first webhook so DNS, TCP and AUTH
+        are not paid inside a request. Failure is logged, not raised.
+        """
+        try:
+            await asyncio.wait_for(asyncio.to_thread(_connect_redis), timeout=timeout)
+            logger.info("Redis connection warmed up")
+        except Exception as e:
+            logger.warning(f"Redis warm-up failed: {e!r}")
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        self._flusher_task = asyncio.create_task(self._flusher())
+
+    async def stop(self) -> None:
+        """Stop the flusher and publish whatever is still buffered."""
+        if self._flusher_task is not None:
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+            self._flusher_task = None
+        batch = self._drain(self._queue.qsize())
+        if batch:
+            await self._publish(batch)
+
+    def _drain(self, limit: int) -> List[str]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _flusher(self) -> None:
+        while True:
+            first = await self._queue.get()
+            # Give concurrent webhooks a moment to join the batch
+            await asyncio.sleep(self._flush_interval)
+            batch = [first] + self._drain(self._batch_size - 1)
+            await self._publish(batch)
+
+    async def _publish(self, batch: List[str]) -> None:
+        try:
+            # Publishing is blocking I/O, keep it off the event loop
+            await asyncio.wait_for(
+                asyncio.to_thread(_publish_batch, batch),
+                timeout=self._publish_timeout
+            )
+            logger.info(f"Scheduled {len(batch)} txn(s) in the delayed set")
+        except Exception as e:
+            logger.info(f"Redis slow/unavailable ({e!r}), using fallback for {len(batch)} txn(s)")
+            for transaction_id in batch:
+                self._fallback(transaction_id)
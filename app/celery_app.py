@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 from app.config import get_settings
 
 settings = get_settings()
@@ -7,7 +8,8 @@ settings = get_settings()
 celery_app = Celery(
     "webhook_service",
     broker=settings.celery_broker_url,
-    backend=settings.celery_result_backend,
+    # No result backend: every task is fire-and-forget, nothing reads results
+    backend=None,
     include=["app.tasks"]
 )
 
@@ -15,12 +17,51 @@ celery_app = Celery(
 celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
-    result_serializer="json",
     timezone="UTC",
     enable_utc=True,
-    task_track_started=True,
+    task_ignore_result=True,
     task_time_limit=300,
     task_soft_time_limit=240,
+    # Tasks only run one batched UPDATE (the processing delay is held in Redis by
+    # app.delayer), so fetch many messages per broker round trip. Acks stay late so
+    # a crashed worker's reserved tasks are redelivered rather than lost.
+    worker_prefetch_multiplier=settings.celery_prefetch_multiplier,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_max_tasks_per_child=1000,
     # These help with common deployment issues
-    broker_connection_retry_on_startup=True
+    broker_connection_retry_on_startup=True,
+    broker_connection_retry=True,
+    broker_connection_max_retries=5,
+    broker_heartbeat=10,
+    # Bound the Redis connection footprint so small plans don't hit their client limit
+    broker_pool_limit=settings.celery_broker_pool_limit,
+    broker_transport_options={
+        # Unacked messages are redelivered after this long. A reserved message can
+        # wait behind up to prefetch x concurrency others, then run up to
+        # task_time_limit (300s); a retry is held unacked until its countdown
+        # (up to 600s) ends. 1800s leaves ample headroom over all of that.
+        "visibility_timeout": 1800,
+        "max_connections": 20,
+        "socket_keepalive": True,
+        "health_check_interval": 30,
+        "retry_on_timeout": True
+    }
 )
+
+
+@worker_process_init.connect
+def init_worker(**_):
+    """Build one pooled engine per worker process, after the fork."""
+    from app.database import init_engine
+    init_engine(
+        pool_size=settings.worker_db_pool_size,
+        max_overflow=settings.worker_db_max_overflow
+    )
+
+
+@worker_process_shutdown.connect
+def shutdown_worker(**_):
+    """Close the worker process's pooled connections on the way out."""
+    from app.database import dispose_engine
+    dispose_engine()
@@ -1,6 +1,8 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import Field
+from pydantic import Field, field_validator
+from sqlalchemy.engine import URL, make_url
 from functools import lru_cache
+from typing import Optional
 import os
 
 class Settings(BaseSettings):
@@ -30,24 +32,55 @@ class Settings(BaseSettings):
         validation_alias="CELERY_BROKER_URL"
     )
     
-    celery_result_backend: str = Field(
-        default="redis://localhost:6379/0",
-        validation_alias="CELERY_RESULT_BACKEND"
-    )
+    # Broker connections kept per worker; match the worker concurrency
+    celery_broker_pool_limit: int = 10
+    # Messages each worker process reserves per broker fetch
+    celery_prefetch_multiplier: int = 64
 
     app_host: str = "0.0.0.0"
     app_port: int = 8000
 
-    def __init__(self, **values):
-        super().__init__(**values)
+    # Per-process connection pool (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 5
+
+    # Each Celery child runs one task at a time on one session, so one connection
+    # plus a spare is enough: --concurrency=10 x (1 + 1) = 20 connections
+    worker_db_pool_size: int = 1
+    worker_db_max_overflow: int = 1
+
+    @field_validator("database_url")
+    @classmethod
+    def _normalize_database_url(cls, value: str) -> str:
         # Force the postgresql:// prefix for SQLAlchemy compatibility
-        if self.database_url.startswith("postgres://"):
-            self.database_url = self.database_url.replace("postgres://", "postgresql://", 1)
-        
-        # Mask password and log the target (helps debugging in Render/Railway)
-        masked_url = self.database_url.split('@')[-1] if '@' in self.database_url else self.database_url
-        print(f"--- CONFIG LOADED. DB TARGET: {masked_url} ---")
+        if value.startswith("postgres://"):
+            return value.replace("postgres://", "postgresql://", 1)
+        return value
+
+    @property
+    def async_database_url(self) -> URL:
+        """
+        Same database, addressed through the asyncpg driver for the API process.
+        Any driver in DATABASE_URL is replaced, and libpq's sslmode is dropped
+        because asyncpg takes it as the ssl connect argument (async_ssl_mode).
+        """
+        return (
+            make_url(self.database_url)
+            .set(drivername="postgresql+asyncpg")
+            .difference_update_query(["sslmode"])
+        )
+
+    @property
+    def async_ssl_mode(self) -> Optional[str]:
+        """sslmode from DATABASE_URL (require, verify-full, ...), which asyncpg accepts as ssl."""
+        return make_url(self.database_url).query.get("sslmode")
 
-@lru_cache()
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    return Settings()
+    settings = Settings()
+    if os.getenv("DEBUG_CONFIG"):
+        # Mask password and log the target (helps debugging in Render/Railway)
+        masked_url = settings.database_url.split('@')[-1] if '@' in settings.database_url else settings.database_url
+        print(f"--- CONFIG LOADED. DB TARGET: {masked_url} ---")
+    return settings
@@ -1,35 +1,122 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import get_settings
+import orjson
 
 settings = get_settings()
 
-# Create database engine - pool sized for concurrent (e.g. 3+ simultaneous POSTs + GETs)
-engine = create_engine(
-    settings.database_url,
+
+def _orjson_dumps(value) -> str:
+    # SQLAlchemy expects a str from json_serializer; orjson returns bytes
+    return orjson.dumps(value).decode()
+
+
+# Pool sizes come from settings and apply per process, so keep
+# total connections <= workers x (pool_size + max_overflow) < Postgres max_connections.
+# LIFO checkout reuses the warmest connection and lets surplus ones idle out.
+
+# Sync engine for the Celery worker and other synchronous code paths.
+# Created lazily so each worker process builds its own pool after fork
+# (see the worker_process_init handler in app.celery_app).
+_engine = None
+
+
+def init_engine(pool_size: int = None, max_overflow: int = None):
+    """Create this process's sync engine if it doesn't exist yet, and return it."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(
+            settings.database_url,
+            pool_pre_ping=True,
+            pool_size=pool_size if pool_size is not None else settings.db_pool_size,
+            max_overflow=max_overflow if max_overflow is not None else settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=1800,
+            pool_use_lifo=True,
+            echo=False,
+            json_serializer=_orjson_dumps,
+            json_deserializer=orjson.loads,
+            connect_args={
+                "connect_timeout": 2,
+                "options": "-c statement_timeout=5000"
+            }
+        )
+    return _engine
+
+
+def dispose_engine() -> None:
+    """Close this process's sync engine and its pooled connections."""
+    global _engine
+    if _engine is not None:
+        ScopedSession.remove()
+        _engine.dispose()
+        _engine = None
+
+
+# asyncpg has no sslmode parameter; hand DATABASE_URL's sslmode over as ssl
+_async_connect_args = {
+    "timeout": 2,
+    "command_timeout": 5,
+    "server_settings": {"statement_timeout": "5000"}
+}
+if settings.async_ssl_mode:
+    _async_connect_args["ssl"] = settings.async_ssl_mode
+
+# Async engine for the FastAPI endpoints so DB I/O never blocks the event loop
+async_engine = create_async_engine(
+    settings.async_database_url,
+    poolclass=AsyncAdaptedQueuePool,
     pool_pre_ping=True,
-    pool_size=15,
-    max_overflow=25,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
     pool_recycle=3600,
+    pool_use_lifo=True,
     echo=False,
-    connect_args={
-        "connect_timeout": 2,
-        "options": "-c statement_timeout=5000"
-    }
+    json_serializer=_orjson_dumps,
+    json_deserializer=orjson.loads,
+    connect_args=_async_connect_args
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create session factories
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, class_=AsyncSession)
+
+
+def _new_session():
+    return SessionLocal(bind=init_engine())
+
+
+# Thread-local sessions for background work, reused instead of rebuilt per call
+ScopedSession = scoped_session(_new_session)
+
+
+@contextmanager
+def session_scope():
+    """
+    Transactional scope on this thread's session: commit on success,
+    rollback on error. close() returns the connection to the pool but
+    keeps the session object registered for reuse by the next task.
+    """
+    session = ScopedSession()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency for getting an async database session."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
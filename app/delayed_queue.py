@@ -0,0 +1,92 @@
+from typing import Iterable, List, Set
+
+import redis
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Sorted set of transaction ids scored by the unix time they become ready
+DELAYED_TXNS_KEY = "delayed_txns"
+
+# Sorted set of transaction ids scored by the unix time they were last popped
+# for Celery; lets the stale sweep tell lost ids from ones still in flight
+DISPATCHED_TXNS_KEY = "dispatched_txns"
+
+# Key holding the token of the one delayer allowed to drain the set
+DELAYER_LOCK_KEY = "delayed_txns:leader"
+
+# Short timeouts: callers fall back rather than hang when Redis is unreachable
+redis_client = redis.Redis.from_url(
+    settings.redis_url,
+    decode_responses=True,
+    socket_connect_timeout=2,
+    socket_timeout=2
+)
+
+# Read, remove and record the hand-off in one atomic step, so concurrent
+# drainers never pop the same id and a popped id is never left unrecorded
+_POP_READY = redis_client.register_script("""
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(ids))
+    for _, id in ipairs(ids) do
+        redis.call('ZADD', KEYS[2], ARGV[1], id)
+    end
+end
+return ids
+""")
+
+# Take the lock if it is free, or extend it if we already hold it
+_HOLD_LOCK = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+""")
+
+
+def push(transaction_ids: Iterable[str], ready_at: float) -> int:
+    """Schedule transactions to become ready at ready_at (unix time); returns how many were new."""
+    mapping = {transaction_id: ready_at for transaction_id in transaction_ids}
+    if not mapping:
+        return 0
+    # nx: a redelivered id keeps its original ready time
+    return redis_client.zadd(DELAYED_TXNS_KEY, mapping, nx=True)
+
+
+def pop_ready(now: float, limit: int) -> List[str]:
+    """Remove and return up to limit ready transaction ids, recording now as their hand-off."""
+    return _POP_READY(keys=[DELAYED_TXNS_KEY, DISPATCHED_TXNS_KEY], args=[now, limit])
+
+
+def dispatched_since(transaction_ids: List[str], since: float) -> Set[str]:
+    """Return the ids among transaction_ids last handed off at or after since."""
+    if not transaction_ids:
+        return set()
+    scores = redis_client.zmscore(DISPATCHED_TXNS_KEY, transaction_ids)
+    return {
+        transaction_id
+        for transaction_id, score in zip(transaction_ids, scores)
+        if score is not None and score >= since
+    }
+
+
+def forget_dispatched(transaction_ids: Iterable[str]) -> None:
+    """Drop the hand-off record of finalized transactions."""
+    transaction_ids = list(transaction_ids)
+    if transaction_ids:
+        redis_client.zrem(DISPATCHED_TXNS_KEY, *transaction_ids)
+
+
+def prune_dispatched(before: float) -> None:
+    """Drop hand-off records older than before; they no longer hold anything back."""
+    redis_client.zremrangebyscore(DISPATCHED_TXNS_KEY, "-inf", f"({before}")
+
+
+def hold_lock(token: str, ttl_ms: int) -> bool:
+    """Acquire or renew the delayer leadership lock for token; True if held."""
+    return bool(_HOLD_LOCK(keys=[DELAYER_LOCK_KEY], args=[token, ttl_ms]))
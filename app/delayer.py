@@ -0,0 +1,138 @@
+"""
+Drains the Redis delayed set and hands ready transactions to Celery.
+
+Every API process runs it in its lifespan, and it can also run on its own:
+
+    python -m app.delayer
+
+A Redis lock elects a single active instance; the others idle until its
+lock expires, so extra copies are safe.
+
+The active instance also sweeps the database for PROCESSING rows that never
+reached Celery (e.g. the process died between pop_ready and the publish, or
+before the scheduler flushed) and puts them back in the delayed set. Ids
+handed to Celery within the task's retry window are left alone, so a stopped
+or backlogged worker does not get the same batch over and over.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from sqlalchemy import bindparam, func, select, text
+
+from app import delayed_queue
+from app.celery_app import celery_app
+from app.database import AsyncSessionLocal
+from app.models import Transaction
+from app.tasks import (
+    finalize_transactions,
+    FINALIZE_BATCH_SIZE,
+    FINALIZE_MAX_RETRIES,
+    FINALIZE_RETRY_BACKOFF_MAX,
+    PROCESSING_DELAY_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 0.5
+# Long enough to survive a slow tick, short enough for a quick failover
+LOCK_TTL_MS = 5000
+
+SWEEP_INTERVAL_SECONDS = 30
+# Well past the normal delay, so rows on their regular path are left alone
+STALE_AFTER_SECONDS = PROCESSING_DELAY_SECONDS + 60
+# Longest a handed-off batch can legitimately stay unfinished: every retry
+# waits its full backoff (jitter only shortens it) and every attempt runs to
+# the task time limit. About 87 minutes with the current settings.
+REDISPATCH_AFTER_SECONDS = (
+    sum(min(2 ** n, FINALIZE_RETRY_BACKOFF_MAX) for n in range(FINALIZE_MAX_RETRIES))
+    + (FINALIZE_MAX_RETRIES + 1) * celery_app.conf.task_time_limit
+)
+
+# Where a sweep starts when it is not resuming a previous one
+_SWEEP_FROM_START = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# The literal status predicate matches idx_txn_processing, so the planner
+# reads the partial index instead of scanning the table. Paged by created_at
+# so rows still in flight at the head cannot hide lost rows behind them.
+_SELECT_STALE = (
+    select(Transaction.transaction_id, Transaction.created_at)
+    .where(text("status = 'PROCESSING'"))
+    .where(Transaction.created_at > bindparam("after"))
+    .where(Transaction.created_at < func.now() - timedelta(seconds=STALE_AFTER_SECONDS))
+    .order_by(Transaction.created_at)
+    .limit(FINALIZE_BATCH_SIZE)
+)
+
+
+def _drain_once() -> int:
+    """Dispatch every ready transaction, one finalize task per batch."""
+    dispatched = 0
+    while True:
+        transaction_ids = delayed_queue.pop_ready(time.time(), FINALIZE_BATCH_SIZE)
+        if not transaction_ids:
+            return dispatched
+        try:
+            finalize_transactions.delay(transaction_ids)
+        except Exception:
+            # Put them back as ready now so the next tick retries them
+            delayed_queue.push(transaction_ids, time.time())
+            raise
+        dispatched += len(transaction_ids)
+        if len(transaction_ids) < FINALIZE_BATCH_SIZE:
+            return dispatched
+
+
+def _requeue_lost(transaction_ids: List[str]) -> int:
+    """Push back the ids not handed to Celery within REDISPATCH_AFTER_SECONDS."""
+    cutoff = time.time() - REDISPATCH_AFTER_SECONDS
+    delayed_queue.prune_dispatched(cutoff)
+    in_flight = delayed_queue.dispatched_since(transaction_ids, cutoff)
+    lost = [transaction_id for transaction_id in transaction_ids if transaction_id not in in_flight]
+    # push() uses nx, so ids still waiting in the set keep their ready time
+    return delayed_queue.push(lost, time.time())
+
+
+async def _sweep_stale(after: datetime) -> Tuple[int, datetime]:
+    """
+    Re-queue lost PROCESSING rows created after `after`, one page at a time.
+    Returns how many were re-queued and where the next sweep should resume.
+    """
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(_SELECT_STALE, {"after": after})).all()
+    # A full page may have more behind it; otherwise start over next time
+    resume = rows[-1].created_at if len(rows) == FINALIZE_BATCH_SIZE else _SWEEP_FROM_START
+    requeued = await asyncio.to_thread(_requeue_lost, [row.transaction_id for row in rows])
+    return requeued, resume
+
+
+async def run() -> None:
+    """Poll the delayed set forever while holding the leadership lock."""
+    token = uuid.uuid4().hex
+    logger.info(f"Delayer started (token {token})")
+    next_sweep = 0.0
+    sweep_from = _SWEEP_FROM_START
+    while True:
+        try:
+            # Redis and broker calls are blocking I/O, keep them off the event loop
+            if await asyncio.to_thread(delayed_queue.hold_lock, token, LOCK_TTL_MS):
+                if time.monotonic() >= next_sweep:
+                    # Scheduled before sweeping so a failing sweep is not retried every tick
+                    next_sweep = time.monotonic() + SWEEP_INTERVAL_SECONDS
+                    requeued, sweep_from = await _sweep_stale(sweep_from)
+                    if requeued:
+                        logger.warning(f"Re-queued {requeued} stale PROCESSING transaction(s)")
+                dispatched = await asyncio.to_thread(_drain_once)
+                if dispatched:
+                    logger.info(f"Dispatched {dispatched} ready transaction(s)")
+        except Exception as e:
+            logger.error(f"Delayer tick failed: {e}")
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
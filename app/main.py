@@ -1,32 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import ValidationError
+from sqlalchemy import bindparam, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from typing import List
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+import asyncio
+import json
 import logging
-import threading
-import time
+import msgspec
 
-from app.database import get_db, engine, Base, SessionLocal
+from app.database import get_db, async_engine, Base, AsyncSessionLocal
 from app.schemas import (
     WebhookRequest,
+    WebhookRequestFast,
     WebhookResponse,
     TransactionResponse,
     HealthResponse
 )
 from app.models import Transaction, TransactionStatus
-from app.tasks import process_transaction
+from app.batch_scheduler import BatchScheduler
+from app import delayer
+from app.tasks import PROCESSING_DELAY_SECONDS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Serializes DDL across workers; any constant shared by all processes works
+SCHEMA_LOCK_ID = 42
+
+
+async def init_db() -> None:
+    """
+    Create database tables (only if they don't exist).
+    The advisory lock lets one worker run the DDL while the others wait,
+    instead of racing each other's CREATE TABLE.
+    """
+    try:
+        async with async_engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": SCHEMA_LOCK_ID})
+            await conn.run_sync(Base.metadata.create_all)
+        logger.info("Database tables verified/created")
+    except Exception as db_init_error:
+        logger.error(f"Database initialization error: {str(db_init_error)}")
+        # Don't fail startup - tables might already exist
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare the schema and Redis connection, then run the scheduler and delayer."""
+    await init_db()
+    await scheduler.warm_up()
+    scheduler.start()
+    delayer_task = asyncio.create_task(delayer.run())
+    yield
+    delayer_task.cancel()
+    await scheduler.stop()
+
+
 # Create FastAPI application
 app = FastAPI(
     title="Transaction Webhook Service",
     description="A service that receives and processes transaction webhooks with background processing",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware - allow_credentials=False when using "*" (browser requirement)
@@ -39,69 +83,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create database tables (only if they don't exist)
-# This is safe to run on every startup but won't recreate existing tables
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables verified/created")
-except Exception as db_init_error:
-    logger.error(f"Database initialization error: {str(db_init_error)}")
-    # Don't fail startup - tables might already exist
+# Strong references to in-flight background tasks; the event loop only keeps weak ones
+_background_tasks = set()
+
+
+def _spawn(coro) -> None:
+    """Run a coroutine in the background without awaiting it."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
-def _process_transaction_in_thread(transaction_id: str) -> None:
+async def _process_transaction_async(transaction_id: str) -> None:
     """
-    Fallback processing when Celery/Redis is unavailable (e.g. Render free tier).
-    Runs in background thread: sleep 25s, then update status to PROCESSED.
+    Fallback processing when Redis is unavailable (e.g. Render free tier).
+    Sleeps PROCESSING_DELAY_SECONDS on the event loop, then updates status to PROCESSED.
+    The session is opened only after the sleep so no connection is held while waiting.
     Evaluator expects PROCESSED within 40s.
     """
     try:
-        time.sleep(25)
-        db = SessionLocal()
-        try:
-            transaction = db.query(Transaction).filter(
-                Transaction.transaction_id == transaction_id
-            ).first()
-            if transaction:
-                transaction.status = TransactionStatus.PROCESSED
-                transaction.processed_at = datetime.utcnow()
-                db.commit()
-                logger.info(f"Processed txn (thread fallback): {transaction_id}")
-            else:
-                logger.error(f"Transaction not found: {transaction_id}")
-        except Exception as e:
-            db.rollback()
-            logger.error(f"Thread fallback failed for {transaction_id}: {e}")
-        finally:
-            db.close()
+        await asyncio.sleep(PROCESSING_DELAY_SECONDS)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Transaction)
+                .where(Transaction.transaction_id == transaction_id)
+                .where(Transaction.status != TransactionStatus.PROCESSED.value)
+                .values(status=TransactionStatus.PROCESSED.value, processed_at=func.now())
+            )
+            await db.commit()
+        if result.rowcount:
+            logger.info(f"Processed txn (async fallback): {transaction_id}")
+        else:
+            logger.info(f"Transaction missing or already processed: {transaction_id}")
     except Exception as e:
-        logger.error(f"Thread fallback error for {transaction_id}: {e}")
+        logger.error(f"Async fallback failed for {transaction_id}: {e}")
 
 
-def _queue_processing_with_fast_fallback(transaction_id: str) -> None:
-    """
-    Try Celery with a 2s timeout. If Redis is down, Celery.delay() blocks 30+ s
-    and the evaluator (40s limit) fails. So we give up after 2s and use thread.
-    """
-    celery_ok = threading.Event()
-    celery_success = []
-
-    def try_celery():
-        try:
-            process_transaction.delay(transaction_id)
-            celery_success.append(True)
-            logger.info(f"Task queued via Celery for txn: {transaction_id}")
-        except Exception as e:
-            logger.warning(f"Celery failed: {e}")
-        finally:
-            celery_ok.set()
-
-    t = threading.Thread(target=try_celery, daemon=True)
-    t.start()
-    # Wait at most 2s for Celery; if still blocking on Redis, use thread fallback
-    if not celery_ok.wait(timeout=2) or not celery_success:
-        logger.info(f"Celery slow/unavailable, using thread fallback for txn: {transaction_id}")
-        _process_transaction_in_thread(transaction_id)
+def _fallback_to_async_processing(transaction_id: str) -> None:
+    """Scheduler fallback: process in-loop when Redis cannot take the transaction."""
+    _spawn(_process_transaction_async(transaction_id))
+
+
+# Batches delayed-set writes off the request path; falls back to in-loop
+# processing if Redis is slow (>2s) or down, so we finish within 40s
+scheduler = BatchScheduler(fallback=_fallback_to_async_processing)
 
 
 @app.get("/", response_model=HealthResponse, tags=["Health"])
@@ -117,63 +142,134 @@ async def health_check():
     )
 
 
-from sqlalchemy.exc import IntegrityError
+class RecentIds:
+    """
+    Bounded LRU of recently accepted transaction ids.
+
+    Best-effort and per process: lets retry floods of the same id return
+    without a DB round trip, while ON CONFLICT stays the source of truth.
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self._ids = OrderedDict()
+        self._maxsize = maxsize
+
+    def seen(self, transaction_id: str) -> bool:
+        if transaction_id in self._ids:
+            self._ids.move_to_end(transaction_id)
+            return True
+        return False
+
+    def add(self, transaction_id: str) -> None:
+        self._ids[transaction_id] = True
+        self._ids.move_to_end(transaction_id)
+        if len(self._ids) > self._maxsize:
+            self._ids.popitem(last=False)
+
+
+recent_ids = RecentIds()
+
+
+def _validate_webhook_body(body: bytes) -> WebhookRequest:
+    """
+    Slow path for bodies msgspec rejects. Validates them the way FastAPI would
+    have, so lax inputs Pydantic accepts (e.g. numeric strings) still pass and
+    errors keep FastAPI's 422 format: {"detail": [{"type", "loc", "msg", ...}]}.
+    """
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise RequestValidationError(
+            [{
+                "type": "json_invalid",
+                "loc": ("body", e.pos),
+                "msg": "JSON decode error",
+                "input": {},
+                "ctx": {"error": e.msg}
+            }],
+            body=e.doc
+        )
+    try:
+        return WebhookRequest.model_validate(payload)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()],
+            body=payload
+        )
+
+
+# Single round trip for the idempotent write: the primary key on transaction_id
+# (already UNIQUE) turns a duplicate into a no-op and RETURNING tells us which
+# branch we hit. Built once at import so SQLAlchemy's compiled-statement cache is reused.
+INSERT_TRANSACTION = (
+    pg_insert(Transaction)
+    .values(
+        transaction_id=bindparam("tid"),
+        source_account=bindparam("src"),
+        destination_account=bindparam("dst"),
+        amount=bindparam("amt"),
+        currency=bindparam("cur"),
+        status=TransactionStatus.PROCESSING.value,
+        created_at=func.now()
+    )
+    .on_conflict_do_nothing(index_elements=[Transaction.transaction_id])
+    .returning(Transaction.transaction_id)
+)
+
 
 @app.post(
     "/v1/webhooks/transactions",
     response_model=WebhookResponse,
     status_code=status.HTTP_202_ACCEPTED,
-    tags=["Webhooks"]
+    tags=["Webhooks"],
+    # Body is decoded by msgspec below; keep the documented schema in OpenAPI
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": WebhookRequest.model_json_schema()}}
+        }
+    }
 )
 async def receive_webhook(
-    webhook_data: WebhookRequest,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Receive transaction webhook and process it in the background.
     Optimized for < 500ms response time.
     """
     start_time = datetime.utcnow()
+    body = await request.body()
     try:
-        # Create new transaction record
-        new_transaction = Transaction(
-            transaction_id=webhook_data.transaction_id,
-            source_account=webhook_data.source_account,
-            destination_account=webhook_data.destination_account,
-            amount=webhook_data.amount,
-            currency=webhook_data.currency,
-            status=TransactionStatus.PROCESSING
-        )
-        
-        db.add(new_transaction)
-        db.commit()
-        
-        # Trigger background processing - MUST NOT BLOCK response
-        # Use fast fallback: try Celery max 2s, then thread (so we finish within 40s)
-        txn_id = webhook_data.transaction_id
-        threading.Thread(target=_queue_processing_with_fast_fallback, args=(txn_id,), daemon=True).start()
+        webhook_data = msgspec.json.decode(body, type=WebhookRequestFast)
+    except (msgspec.ValidationError, msgspec.DecodeError):
+        webhook_data = _validate_webhook_body(body)
 
-        elapsed = (datetime.utcnow() - start_time).total_seconds() * 1000
-        logger.info(f"Webhook processed in {elapsed:.2f}ms for txn: {webhook_data.transaction_id}")
-        
-        return WebhookResponse(
-            message="Webhook received",
-            transaction_id=webhook_data.transaction_id
-        )
-        
-    except IntegrityError:
-        # Duplicate transaction_id (idempotency) - still ensure processing runs
-        db.rollback()
-        txn_id = webhook_data.transaction_id
-        logger.info(f"Duplicate webhook (IntegrityError) for txn: {txn_id}")
-        threading.Thread(target=_queue_processing_with_fast_fallback, args=(txn_id,), daemon=True).start()
+    txn_id = webhook_data.transaction_id
+    if recent_ids.seen(txn_id):
+        logger.info(f"Duplicate webhook (cached) for txn: {txn_id}")
         return WebhookResponse(
             message="Webhook received (duplicate)",
             transaction_id=txn_id
         )
+
+    try:
+        result = await db.execute(
+            INSERT_TRANSACTION,
+            {
+                "tid": txn_id,
+                "src": webhook_data.source_account,
+                "dst": webhook_data.destination_account,
+                "amt": webhook_data.amount,
+                "cur": webhook_data.currency,
+            }
+        )
+        inserted = result.scalar_one_or_none() is not None
+        await db.commit()
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}")
-        db.rollback()
+        await db.rollback()
         # If it's a timeout or connection issue, this might still return 500
         # But with reduced timeout in database.py, it will fail faster.
         raise HTTPException(
@@ -181,6 +277,26 @@ async def receive_webhook(
             detail="Failed to process webhook"
         )
 
+    recent_ids.add(txn_id)
+    if not inserted:
+        # Duplicate transaction_id (idempotency) - already stored and queued
+        logger.info(f"Duplicate webhook for txn: {txn_id}")
+        return WebhookResponse(
+            message="Webhook received (duplicate)",
+            transaction_id=txn_id
+        )
+
+    # Trigger background processing - MUST NOT BLOCK response
+    await scheduler.enqueue(txn_id)
+
+    elapsed = (datetime.utcnow() - start_time).total_seconds() * 1000
+    logger.info(f"Webhook processed in {elapsed:.2f}ms for txn: {txn_id}")
+
+    return WebhookResponse(
+        message="Webhook received",
+        transaction_id=txn_id
+    )
+
 
 @app.get(
     "/v1/transactions/{transaction_id}",
@@ -189,7 +305,7 @@ async def receive_webhook(
 )
 async def get_transaction(
     transaction_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Retrieve transaction status by transaction_id.
@@ -204,9 +320,10 @@ async def get_transaction(
     Raises:
         404: If transaction not found
     """
-    transaction = db.query(Transaction).filter(
-        Transaction.transaction_id == transaction_id
-    ).first()
+    result = await db.execute(
+        select(Transaction).where(Transaction.transaction_id == transaction_id)
+    )
+    transaction = result.scalar_one_or_none()
     
     if not transaction:
         raise HTTPException(
@@ -214,7 +331,11 @@ async def get_transaction(
             detail=f"Transaction {transaction_id} not found"
         )
     
-    return [transaction]
+    # Row comes straight from our own table, so skip re-validating it;
+    # mode="json" keeps the documented ...Z timestamp format
+    return ORJSONResponse([
+        TransactionResponse.model_construct(**transaction.__dict__).model_dump(mode="json")
+    ])
 
 
 @app.exception_handler(Exception)
@@ -1,12 +1,11 @@
-from sqlalchemy import Column, String, Float, DateTime, Enum as SQLEnum, Index
-from sqlalchemy.sql import func
-from datetime import datetime
+from sqlalchemy import Column, String, Float, DateTime, CheckConstraint, Index, func, text
+from datetime import datetime, timezone
 import enum
 from app.database import Base
 
 
 class TransactionStatus(str, enum.Enum):
-    """Transaction status enumeration."""
+    """Transaction status enumeration (stored as plain VARCHAR, see Transaction.status)."""
     PROCESSING = "PROCESSING"
     PROCESSED = "PROCESSED"
     FAILED = "FAILED"
@@ -17,19 +16,31 @@ class Transaction(Base):
     
     __tablename__ = "transactions"
     
-    transaction_id = Column(String, primary_key=True, index=True)
+    # Primary key already carries a unique btree; no separate index needed
+    transaction_id = Column(String, primary_key=True)
     source_account = Column(String, nullable=False)
     destination_account = Column(String, nullable=False)
     amount = Column(Float, nullable=False)
     currency = Column(String, nullable=False)
-    status = Column(SQLEnum(TransactionStatus), default=TransactionStatus.PROCESSING, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # VARCHAR + CHECK instead of a native ENUM: new statuses need no ALTER TYPE
+    status = Column(String(12), default=TransactionStatus.PROCESSING.value, nullable=False)
+    # The webhook INSERT sets now() explicitly. The Python default covers ORM
+    # inserts (no refresh SELECT); the server default covers any other writer.
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        nullable=False
+    )
     processed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Create index for faster queries
+    # Partial index over in-flight rows only; a full index on the 3-value status
+    # column is rarely used by the planner and slows every write
     __table_args__ = (
-        Index('idx_transaction_status', 'status'),
+        Index('idx_txn_processing', 'created_at', postgresql_where=text("status = 'PROCESSING'")),
         Index('idx_transaction_created_at', 'created_at'),
+        CheckConstraint("status IN ('PROCESSING','PROCESSED','FAILED')", name='ck_txn_status'),
     )
     
     def __repr__(self):
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Optional
+import msgspec
 from app.models import TransactionStatus
 
 
@@ -13,8 +14,10 @@ class WebhookRequest(BaseModel):
     amount: float = Field(..., gt=0, description="Transaction amount (must be positive)")
     currency: str = Field(..., min_length=3, max_length=3, description="Currency code (e.g., INR, USD)")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        defer_build=False,
+        json_schema_extra={
             "example": {
                 "transaction_id": "txn_abc123def456",
                 "source_account": "acc_user_789",
@@ -23,11 +26,27 @@ class WebhookRequest(BaseModel):
                 "currency": "INR"
             }
         }
+    )
+
+
+class WebhookRequestFast(msgspec.Struct):
+    """
+    Webhook body decoded by msgspec on the hot path.
+    Mirrors WebhookRequest, which remains the documented OpenAPI schema.
+    """
+    
+    transaction_id: str
+    source_account: str
+    destination_account: str
+    amount: Annotated[float, msgspec.Meta(gt=0)]
+    currency: Annotated[str, msgspec.Meta(min_length=3, max_length=3)]
 
 
 class WebhookResponse(BaseModel):
     """Schema for webhook acknowledgment response."""
     
+    model_config = ConfigDict(from_attributes=True, defer_build=False)
+    
     message: str = "Webhook received"
     transaction_id: str
 
@@ -44,9 +63,10 @@ class TransactionResponse(BaseModel):
     created_at: datetime
     processed_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
-        json_schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        defer_build=False,
+        json_schema_extra={
             "example": {
                 "transaction_id": "txn_abc123def456",
                 "source_account": "acc_user_789",
@@ -58,10 +78,20 @@ class TransactionResponse(BaseModel):
                 "processed_at": "2024-01-15T10:30:30Z"
             }
         }
+    )
 
 
 class HealthResponse(BaseModel):
     """Schema for health check response."""
     
+    model_config = ConfigDict(from_attributes=True, defer_build=False)
+    
     status: str = "HEALTHY"
     current_time: datetime
+
+
+# Build validators/serializers at import time so the first request doesn't pay for it
+for _model in (WebhookRequest, WebhookResponse, TransactionResponse, HealthResponse):
+    _model.model_rebuild()
+    _ = _model.__pydantic_serializer__
+    _ = _model.__pydantic_validator__
@@ -1,69 +1,103 @@
-import time
-from datetime import datetime
-from sqlalchemy.orm import Session
+from typing import List
+from sqlalchemy import bindparam, func, select, update
+from app import delayed_queue
 from app.celery_app import celery_app
-from app.database import SessionLocal
+from app.database import session_scope
 from app.models import Transaction, TransactionStatus
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Simulated external API delay. Waiting transactions sit in a Redis sorted
+# set (app.delayed_queue) until app.delayer hands them to finalize_transactions.
+PROCESSING_DELAY_SECONDS = 25
 
-@celery_app.task(bind=True, max_retries=3)
-def process_transaction(self, transaction_id: str):
+# Upper bound on transactions finalized by one UPDATE
+FINALIZE_BATCH_SIZE = 500
+
+# Retry policy of finalize_transactions; app.delayer derives its re-dispatch window from it
+FINALIZE_MAX_RETRIES = 11
+FINALIZE_RETRY_BACKOFF_MAX = 600
+
+# Statements built once at import; executed with the batch as an expanding
+# bind parameter, so each call skips statement construction entirely.
+# Timestamps come from the database clock (now()), not Python.
+# Delivery is at-least-once (late acks, scheduler fallback, stale sweep), so
+# a repeat never re-stamps processed_at on a row that is already PROCESSED
+_MARK_PROCESSED = (
+    update(Transaction)
+    .where(Transaction.transaction_id.in_(bindparam("tids", expanding=True)))
+    .where(Transaction.status != TransactionStatus.PROCESSED.value)
+    .values(status=TransactionStatus.PROCESSED.value, processed_at=func.now())
+    .returning(Transaction.transaction_id)
+)
+# Never downgrades a PROCESSED row
+_MARK_FAILED = (
+    update(Transaction)
+    .where(Transaction.transaction_id.in_(bindparam("tids", expanding=True)))
+    .where(Transaction.status != TransactionStatus.PROCESSED.value)
+    .values(status=TransactionStatus.FAILED.value, processed_at=func.now())
+    .returning(Transaction.transaction_id)
+)
+# Tells ids already processed apart from ids that do not exist
+_SELECT_EXISTING = (
+    select(Transaction.transaction_id)
+    .where(Transaction.transaction_id.in_(bindparam("tids", expanding=True)))
+)
+
+
+# Exponential backoff with jitter (capped at 10 minutes) spreads retries out
+# instead of every failed batch hitting the database again at the same moment
+@celery_app.task(
+    ignore_result=True,
+    max_retries=FINALIZE_MAX_RETRIES,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=FINALIZE_RETRY_BACKOFF_MAX,
+    retry_jitter=True
+)
+def finalize_transactions(transaction_ids: List[str]):
     """
-    Background task to process a transaction.
-    
-    This task simulates external API calls with a 30-second delay,
-    then updates the transaction status to PROCESSED.
-    
+    Background task to finish processing a batch of transactions.
+
+    Runs once the simulated external API delay has elapsed and updates
+    the status of every transaction in the batch to PROCESSED in one
+    UPDATE and one commit.
+
     Args:
-        transaction_id: The unique transaction identifier
+        transaction_ids: The unique transaction identifiers
     """
-    logger.info(f"Task received for transaction: {transaction_id}")
-    
+    logger.info(f"Task received for {len(transaction_ids)} transaction(s)")
+
     try:
-        # Simulate external API call (long delay) 
-        # We do this BEFORE opening the database connection to free up the pool
-        time.sleep(25) 
-        
-        db = SessionLocal()
+        with session_scope() as db:
+            processed = db.execute(_MARK_PROCESSED, {"tids": transaction_ids}).scalars().all()
+            skipped = sorted(set(transaction_ids).difference(processed))
+            # Only runs for repeats or unknown ids, not on the normal path
+            existing = db.execute(_SELECT_EXISTING, {"tids": skipped}).scalars().all() if skipped else []
+
+        logger.info(f"Successfully processed {len(processed)} transaction(s)")
         try:
-            logger.info(f"Updating status for transaction: {transaction_id}")
-            transaction = db.query(Transaction).filter(
-                Transaction.transaction_id == transaction_id
-            ).first()
-            
-            if transaction:
-                transaction.status = TransactionStatus.PROCESSED
-                transaction.processed_at = datetime.utcnow()
-                db.commit()
-                logger.info(f"Successfully processed transaction: {transaction_id}")
-            else:
-                logger.error(f"Transaction not found in database: {transaction_id}")
-        except Exception as db_err:
-            db.rollback()
-            raise db_err
-        finally:
-            db.close()
-            
+            delayed_queue.forget_dispatched(transaction_ids)
+        except Exception as e:
+            # Harmless: the record ages out and the row is no longer PROCESSING
+            logger.warning(f"Could not clear hand-off records: {e!r}")
+        if existing:
+            logger.info(f"Skipped {len(existing)} already processed transaction(s)")
+        missing = set(skipped).difference(existing)
+        if missing:
+            logger.error(f"Transactions not found in database: {sorted(missing)}")
+
     except Exception as e:
-        logger.error(f"Error processing transaction {transaction_id}: {str(e)}")
-        
+        logger.error(f"Error processing {len(transaction_ids)} transaction(s): {str(e)}")
+
         # Attempt to update status to FAILED as a fallback
-        fallback_db = SessionLocal()
         try:
-            transaction = fallback_db.query(Transaction).filter(
-                Transaction.transaction_id == transaction_id
-            ).first()
-            if transaction:
-                transaction.status = TransactionStatus.FAILED
-                transaction.processed_at = datetime.utcnow()
-                fallback_db.commit()
+            with session_scope() as fallback_db:
+                failed = fallback_db.execute(_MARK_FAILED, {"tids": transaction_ids}).scalars().all()
+            logger.info(f"Marked {len(failed)} transaction(s) as FAILED")
         except Exception as update_error:
             logger.error(f"Failed to update transaction status to FAILED: {str(update_error)}")
-        finally:
-            fallback_db.close()
-        
-        # Retry the task
-        raise self.retry(exc=e, countdown=60)
+
+        # Re-raise so autoretry_for schedules the next attempt
+        raise
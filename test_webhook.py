@@ -7,17 +7,28 @@ This script tests:
 2. Single transaction webhook
 3. Duplicate transaction handling (idempotency)
 4. Transaction status retrieval
+
+Independent tests run concurrently on one shared async client.
+Requires: pip install "httpx[http2]"
 """
 
-import requests
+import asyncio
+import httpx
 import time
 import json
+import uuid
 from datetime import datetime
 
 
 # Configuration
 BASE_URL = "http://localhost:8000"  # Change this to your deployed URL
 
+# Deadline for a transaction to reach PROCESSED (evaluator allows 40s)
+PROCESSING_TIMEOUT_SECONDS = 40
+
+# Concurrent copies of the same webhook sent by the idempotency test
+DUPLICATE_ATTEMPTS = 16
+
 
 def print_section(title):
     """Print a formatted section header."""
@@ -26,11 +37,11 @@ def print_section(title):
     print("=" * 60)
 
 
-def test_health_check():
+async def test_health_check(client):
     """Test the health check endpoint."""
     print_section("Testing Health Check")
     
-    response = requests.get(f"{BASE_URL}/")
+    response = await client.get("/")
     print(f"Status Code: {response.status_code}")
     print(f"Response: {json.dumps(response.json(), indent=2)}")
     
@@ -39,7 +50,7 @@ def test_health_check():
     print("✅ Health check passed!")
 
 
-def test_single_transaction():
+async def test_single_transaction(client):
     """Test sending a single transaction webhook."""
     print_section("Testing Single Transaction")
     
@@ -53,12 +64,9 @@ def test_single_transaction():
     
     print(f"Sending webhook: {json.dumps(transaction_data, indent=2)}")
     
-    start_time = time.time()
-    response = requests.post(
-        f"{BASE_URL}/v1/webhooks/transactions",
-        json=transaction_data
-    )
-    response_time = (time.time() - start_time) * 1000
+    start_time = time.perf_counter()
+    response = await client.post("/v1/webhooks/transactions", json=transaction_data)
+    response_time = (time.perf_counter() - start_time) * 1000
     
     print(f"Status Code: {response.status_code}")
     print(f"Response Time: {response_time:.2f}ms")
@@ -71,10 +79,13 @@ def test_single_transaction():
     return transaction_data["transaction_id"]
 
 
-def test_duplicate_transaction(transaction_id):
+async def test_duplicate_transaction(client):
     """Test duplicate transaction handling (idempotency)."""
     print_section("Testing Duplicate Transaction (Idempotency)")
     
+    # Fresh id so no request can be answered from the server's recent-id cache;
+    # the first copies race each other into the database's ON CONFLICT
+    transaction_id = f"txn_test_dup_{uuid.uuid4().hex[:12]}"
     transaction_data = {
         "transaction_id": transaction_id,
         "source_account": "acc_user_789",
@@ -83,28 +94,34 @@ def test_duplicate_transaction(transaction_id):
         "currency": "INR"
     }
     
-    print(f"Sending duplicate webhook with transaction_id: {transaction_id}")
+    print(f"Sending {DUPLICATE_ATTEMPTS} concurrent duplicate webhooks with transaction_id: {transaction_id}")
     
-    # Send the same transaction 3 times
-    for i in range(3):
-        response = requests.post(
-            f"{BASE_URL}/v1/webhooks/transactions",
-            json=transaction_data
-        )
-        print(f"Attempt {i+1}: Status {response.status_code}")
-        assert response.status_code == 202
+    # Send the same transaction concurrently to exercise the idempotency race
+    responses = await asyncio.gather(*(
+        client.post("/v1/webhooks/transactions", json=transaction_data)
+        for _ in range(DUPLICATE_ATTEMPTS)
+    ))
+    
+    for i, response in enumerate(responses):
+        print(f"Attempt {i+1}: Status {response.status_code}, {response.json()['message']}")
+    assert all(response.status_code == 202 for response in responses)
+    
+    # Exactly one request may win the insert; every other one is a duplicate
+    messages = [response.json()["message"] for response in responses]
+    assert messages.count("Webhook received") == 1, f"Expected one accepted webhook, got {messages}"
+    assert messages.count("Webhook received (duplicate)") == DUPLICATE_ATTEMPTS - 1
     
     print("✅ Duplicate transaction test passed!")
 
 
-def test_transaction_status(transaction_id):
+async def test_transaction_status(client, transaction_id):
     """Test retrieving transaction status."""
     print_section("Testing Transaction Status Retrieval")
     
     print(f"Checking status for transaction: {transaction_id}")
     
     # Check immediately (should be PROCESSING)
-    response = requests.get(f"{BASE_URL}/v1/transactions/{transaction_id}")
+    response = await client.get(f"/v1/transactions/{transaction_id}")
     print(f"\nImmediate check:")
     print(f"Status Code: {response.status_code}")
     print(f"Response: {json.dumps(response.json(), indent=2)}")
@@ -114,12 +131,19 @@ def test_transaction_status(transaction_id):
     assert transaction["status"] == "PROCESSING"
     print("✅ Transaction is in PROCESSING status")
     
-    # Wait for processing to complete (30 seconds + buffer)
-    print("\nWaiting 35 seconds for processing to complete...")
-    time.sleep(35)
+    # Poll with capped exponential backoff until PROCESSED (evaluator allows 40s)
+    print("\nWaiting for processing to complete...")
+    deadline = time.monotonic() + PROCESSING_TIMEOUT_SECONDS
+    delay = 0.5
+    while time.monotonic() < deadline:
+        response = await client.get(f"/v1/transactions/{transaction_id}")
+        if response.json()[0]["status"] == "PROCESSED":
+            break
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 3.0)
+    else:
+        raise AssertionError(f"Transaction was not PROCESSED within {PROCESSING_TIMEOUT_SECONDS} seconds")
     
-    # Check again (should be PROCESSED)
-    response = requests.get(f"{BASE_URL}/v1/transactions/{transaction_id}")
     print(f"\nAfter processing:")
     print(f"Status Code: {response.status_code}")
     print(f"Response: {json.dumps(response.json(), indent=2)}")
@@ -131,12 +155,12 @@ def test_transaction_status(transaction_id):
     print("✅ Transaction successfully processed!")
 
 
-def test_nonexistent_transaction():
+async def test_nonexistent_transaction(client):
     """Test querying a non-existent transaction."""
     print_section("Testing Non-existent Transaction")
     
     fake_id = "txn_does_not_exist"
-    response = requests.get(f"{BASE_URL}/v1/transactions/{fake_id}")
+    response = await client.get(f"/v1/transactions/{fake_id}")
     
     print(f"Status Code: {response.status_code}")
     print(f"Response: {json.dumps(response.json(), indent=2)}")
@@ -145,33 +169,39 @@ def test_nonexistent_transaction():
     print("✅ Non-existent transaction test passed!")
 
 
+async def test_transaction_lifecycle(client):
+    """Single transaction then status test; the second needs the first's id."""
+    transaction_id = await test_single_transaction(client)
+    await test_transaction_status(client, transaction_id)
+
+
+async def main():
+    """Run independent tests concurrently, so the suite takes as long as its slowest test."""
+    # http2 multiplexes every request over one connection where the server
+    # supports it (HTTPS deployments); plain-HTTP localhost stays on HTTP/1.1
+    async with httpx.AsyncClient(base_url=BASE_URL, http2=True) as client:
+        await asyncio.gather(
+            test_health_check(client),
+            test_nonexistent_transaction(client),
+            test_duplicate_transaction(client),
+            test_transaction_lifecycle(client)
+        )
+
+
 def run_all_tests():
-    """Run all tests in sequence."""
+    """Run all tests."""
     print("\n" + "🚀" * 30)
     print("  WEBHOOK SERVICE TEST SUITE")
     print("🚀" * 30)
     
     try:
-        # Test 1: Health Check
-        test_health_check()
-        
-        # Test 2: Single Transaction
-        transaction_id = test_single_transaction()
-        
-        # Test 3: Duplicate Transaction
-        test_duplicate_transaction(transaction_id)
-        
-        # Test 4: Non-existent Transaction
-        test_nonexistent_transaction()
-        
-        # Test 5: Transaction Status (includes waiting)
-        test_transaction_status(transaction_id)
+        asyncio.run(main())
         
         print_section("ALL TESTS PASSED! 🎉")
         
     except AssertionError as e:
         print(f"\n❌ Test failed: {str(e)}")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         print(f"\n❌ Could not connect to {BASE_URL}")
         print("Make sure the service is running!")
     except Exception as e: